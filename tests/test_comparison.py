@@ -0,0 +1,55 @@
+from vistal.comparison import (
+    ERROR_MATCH,
+    ERROR_FALSE_POSITIVE,
+    ERROR_MISS,
+    ERROR_WRONG_LABEL,
+    error_temporal_list
+)
+
+
+def test_exact_match():
+    assert error_temporal_list([(0, 10, 1)], [(0, 10, 1)]) == [
+        (0, 10, ERROR_MATCH)
+    ]
+
+
+def test_false_positive():
+    assert error_temporal_list([(0, 4, 1)], [(0, 4, 1), (6, 8, 2)]) == [
+        (0, 4, ERROR_MATCH),
+        (6, 8, ERROR_FALSE_POSITIVE),
+    ]
+
+
+def test_miss():
+    assert error_temporal_list([(0, 4, 1), (6, 8, 2)], [(2, 4, 1)]) == [
+        (0, 2, ERROR_MISS),
+        (2, 4, ERROR_MATCH),
+        (6, 8, ERROR_MISS),
+    ]
+
+
+def test_swapped_labels():
+    assert error_temporal_list(
+        [(0, 5, 1), (5, 10, 2)], [(0, 5, 2), (5, 10, 1)]
+    ) == [(0, 10, ERROR_WRONG_LABEL)]
+
+
+def test_overlapping_proposals_still_match():
+    assert error_temporal_list([(0, 10, 1)], [(0, 10, 1), (2, 8, 2)]) == [
+        (0, 10, ERROR_MATCH)
+    ]
+
+
+def test_overlapping_wrong_proposals():
+    assert error_temporal_list([(0, 10, 1)], [(0, 4, 1), (2, 8, 2)]) == [
+        (0, 4, ERROR_MATCH),
+        (4, 8, ERROR_WRONG_LABEL),
+        (8, 10, ERROR_MISS),
+    ]
+
+
+def test_empty():
+    assert error_temporal_list([], []) == []
+    assert error_temporal_list([], [(1, 2, 0)]) == [
+        (1, 2, ERROR_FALSE_POSITIVE)
+    ]
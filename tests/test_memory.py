@@ -0,0 +1,200 @@
+'''
+Memory checks of the generation pipeline, with tracemalloc.
+
+Each stage is run on synthetic inputs, recording its peak traced memory and
+the number of memory blocks it allocated and still holds at its end.
+tracemalloc does not count allocations that are freed within the stage, but
+they are reflected in the peak. The tests fail if memory grows faster than
+the number of sections, or grows with the label vocabulary size, so that
+regressions are caught before a release. They take about a minute, and only
+run when asked for:
+
+    python -m pytest tests/test_memory.py --run-slow
+'''
+import contextlib
+import io
+import random
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+
+from vistal import Colour, ColourScheme, vistal
+from vistal.timeline import (
+    TimelinePositionCalculator,
+    Timeline,
+    temporal_repartition
+)
+
+
+pytestmark = pytest.mark.slow
+
+STAGES = ['temporal_repartition', 'Timeline', 'vistal', 'save']
+
+SIZES = (200, 400, 800)
+
+# Allowed growth of memory when the number of sections grows by a factor k is
+# k**MAX_EXPONENT, e.g. 2**1.3 = 2.46 times when it doubles.
+MAX_EXPONENT = 1.3
+
+# Allowed growth of memory when SIZES[1] sections use VOCABULARY_SIZES[1]
+# labels instead of VOCABULARY_SIZES[0]. Overlapping sections then rarely
+# share a label, so there are more labels to show in each interval, which
+# takes about 1.3 times the memory; memory proportional to the vocabulary
+# size would not fit.
+VOCABULARY_SIZES = (20, 1000)
+MAX_VOCABULARY_GROWTH = 2
+
+
+@dataclass
+class StageMemory:
+    stage: str
+    n_sections: int
+    n_labels: int
+    peak: int             # peak traced memory during the stage, in bytes
+    retained_blocks: int  # blocks allocated by the stage, alive at its end
+
+
+def synthetic_temporal_list(
+    n_sections: int, video_duration: float, n_labels: int, seed: int = 0
+) -> List[Tuple[float, float, int]]:
+    '''
+    Random, possibly overlapping sections, like proposals of a detector.
+    '''
+    rng = random.Random(seed)
+    res = []
+    for _ in range(n_sections):
+        start = rng.uniform(0, video_duration)
+        end = min(start + rng.uniform(0.5, 20), video_duration)
+        res.append((start, end, rng.randrange(n_labels)))
+    return res
+
+
+def synthetic_colour_scheme(n_labels: int) -> ColourScheme:
+    # distinctipy is too slow for large vocabularies, and is not under test
+    rng = random.Random(0)
+    return ColourScheme(colours=[
+        Colour(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        for _ in range(n_labels)
+    ])
+
+
+def trace(func: Callable):
+    '''
+    Returns the result of func, its peak traced memory and the number of
+    blocks it allocated that are still alive when it returns.
+    '''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        res = func()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained_blocks = sum(
+        max(stat.count_diff, 0)
+        for stat in after.compare_to(before, 'filename')
+    )
+    return res, peak, retained_blocks
+
+
+def profile_memory(
+    directory: Path, n_sections: int, n_labels: int = 20, n_fold: int = 1
+) -> Dict[str, StageMemory]:
+    '''
+    Run each stage once, on two synthetic temporal lists of n_sections
+    sections, whose video duration grows with n_sections. The vistal stage
+    generates all the event items of a subtitle. The save stage saves a
+    subtitle just returned by vistal into directory, which generates and
+    serializes its timelines on the way, as for users.
+    '''
+    video_duration = max(n_sections, 10)
+    temporal_list_dict = {
+        'gt': synthetic_temporal_list(n_sections, video_duration, n_labels, 0),
+        'pred': synthetic_temporal_list(n_sections, video_duration, n_labels, 1),
+    }
+    label_names = {i: f'Action {i}' for i in range(n_labels)}
+    colour_scheme = synthetic_colour_scheme(n_labels)
+    display_width, display_height = 3840, 2160
+    tl_pos_cal = TimelinePositionCalculator(
+        display_width, display_height, 108, 9, 0, 90, 6, 10, 21, 4, n_fold
+    )
+
+    res = {}
+    def record(stage, func):
+        value, peak, retained_blocks = trace(func)
+        res[stage] = StageMemory(
+            stage, n_sections, n_labels, peak, retained_blocks
+        )
+        return value
+
+    temporal_list = temporal_list_dict['gt']
+    record('temporal_repartition', lambda: temporal_repartition(
+        temporal_list, n_fold, video_duration
+    ))
+    record('Timeline', lambda: Timeline(
+        'gt', tl_pos_cal, 0, temporal_list, video_duration, label_names,
+        colour_scheme, n_fold, colour_scheme.transparent
+    ))
+    def new_subtitle():
+        return vistal(
+            temporal_list_dict, label_names, colour_scheme, video_duration,
+            display_width, display_height, n_fold=n_fold
+        )
+    # vistal() generates the timelines lazily, on the first use of events
+    record('vistal', lambda: new_subtitle().events())
+    sub = new_subtitle()
+    with contextlib.redirect_stdout(io.StringIO()): # mute save message
+        record('save', lambda: sub.save(
+            directory / f'{n_sections}_{n_labels}.ass',
+            confirm_overwrite=False
+        ))
+    return res
+
+
+@pytest.fixture(scope='module')
+def directory(tmp_path_factory):
+    return tmp_path_factory.mktemp('memory')
+
+
+@pytest.fixture(scope='module')
+def records_by_size(directory):
+    profile_memory(directory, 50) # warm up, e.g. lazy imports
+    return {size: profile_memory(directory, size) for size in SIZES}
+
+
+@pytest.fixture(scope='module')
+def records_by_vocabulary(directory, records_by_size):
+    n_labels_a, n_labels_b = VOCABULARY_SIZES
+    return {
+        n_labels_a: records_by_size[SIZES[1]],
+        n_labels_b: profile_memory(directory, SIZES[1], n_labels_b),
+    }
+
+
+@pytest.mark.parametrize('stage', STAGES)
+@pytest.mark.parametrize('field', ['peak', 'retained_blocks'])
+def test_memory_scales_with_sections(records_by_size, stage, field):
+    for size_a, size_b in zip(SIZES[:-1], SIZES[1:]):
+        a = getattr(records_by_size[size_a][stage], field)
+        b = getattr(records_by_size[size_b][stage], field)
+        limit = (size_b / size_a) ** MAX_EXPONENT
+        assert b / max(a, 1) <= limit, (
+            f'{stage} {field} grows {b/max(a, 1):.2f} times from {size_a} to '
+            f'{size_b} sections, limit {limit:.2f}.'
+        )
+
+
+@pytest.mark.parametrize('stage', STAGES)
+@pytest.mark.parametrize('field', ['peak', 'retained_blocks'])
+def test_memory_independent_of_vocabulary(records_by_vocabulary, stage, field):
+    n_labels_a, n_labels_b = VOCABULARY_SIZES
+    a = getattr(records_by_vocabulary[n_labels_a][stage], field)
+    b = getattr(records_by_vocabulary[n_labels_b][stage], field)
+    assert b / max(a, 1) <= MAX_VOCABULARY_GROWTH, (
+        f'{stage} {field} grows {b/max(a, 1):.2f} times from {n_labels_a} to '
+        f'{n_labels_b} labels, limit {MAX_VOCABULARY_GROWTH:.2f}.'
+    )
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from vistal.server import LocalStore, SubtitleService, make_handler
+
+
+DEFAULTS = dict(display_width=1280, display_height=720)
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    '''
+    Counts the generations submitted, which wait for gate to be set.
+    '''
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.n_submitted = 0
+        self.gate = threading.Event()
+        self.gate.set()
+    def submit(self, fn, *args, **kwargs):
+        self.n_submitted += 1
+        def run():
+            self.gate.wait()
+            return fn(*args, **kwargs)
+        return super().submit(run)
+
+
+def write_video(directory, video_id, label_names=None):
+    if label_names is None:
+        label_names = {'0': 'foo', '1': 'bar'}
+    label_ids = [int(x) for x in label_names]
+    content = dict(
+        video_duration=6,
+        temporal_list_dict={
+            'gt': [[0, 3, label_ids[0]], [3, 6, label_ids[-1]]],
+        },
+        label_names=label_names,
+    )
+    (directory / f'{video_id}.json').write_text(json.dumps(content))
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = SubtitleService(
+        LocalStore(tmp_path), executor=CountingExecutor(), cache_size=1,
+        **DEFAULTS
+    )
+    yield service
+    service.close()
+
+
+async def request(handler, path, method='GET'):
+    '''
+    Returns the status and body of a request to a server with handler.
+    '''
+    server = await asyncio.start_server(handler, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'{method} {path} HTTP/1.1\r\nHost: x\r\n\r\n'.encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    head, body = response.split(b'\r\n\r\n', 1)
+    return int(head.split()[1]), body
+
+
+def test_get_subtitle(tmp_path, service):
+    write_video(tmp_path, 'v1')
+    status, body = asyncio.run(request(make_handler(service), '/v1.ass'))
+    assert status == 200
+    assert body.startswith(b'[Script Info]')
+    assert b'foo' in body
+
+
+def test_sparse_label_ids(tmp_path, service):
+    write_video(tmp_path, 'v1', {'0': 'foo', '5': 'bar'})
+    status, body = asyncio.run(request(make_handler(service), '/v1.ass'))
+    assert status == 200
+    assert b'bar' in body
+
+
+@pytest.mark.parametrize('path', ['/missing.ass', '/v1.json'])
+def test_not_found(tmp_path, service, path):
+    write_video(tmp_path, 'v1')
+    status, _ = asyncio.run(request(make_handler(service), path))
+    assert status == 404
+
+
+@pytest.mark.parametrize('path', ['/v1%0A.ass', '/..%2Fv1.ass', '/.v1.ass'])
+def test_invalid_video_id(tmp_path, service, path):
+    write_video(tmp_path, 'v1')
+    status, _ = asyncio.run(request(make_handler(service), path))
+    assert status == 400
+
+
+def test_method_not_allowed(tmp_path, service):
+    write_video(tmp_path, 'v1')
+    status, _ = asyncio.run(request(make_handler(service), '/v1.ass', 'POST'))
+    assert status == 405
+
+
+def test_concurrent_requests_share_generation(tmp_path, service):
+    write_video(tmp_path, 'v1')
+    service.executor.gate.clear()
+    async def get_twice():
+        asyncio.get_running_loop().call_later(0.5, service.executor.gate.set)
+        return await asyncio.gather(service.get('v1'), service.get('v1'))
+    a, b = asyncio.run(get_twice())
+    assert a == b
+    assert service.executor.n_submitted == 1
+    assert service.pending == {}
+
+
+def test_cache_evicts_least_recently_used(tmp_path, service):
+    write_video(tmp_path, 'v1')
+    write_video(tmp_path, 'v2', {'0': 'baz', '1': 'qux'})
+    async def get_all(video_ids):
+        return [await service.get(x) for x in video_ids]
+    v1, v1_cached = asyncio.run(get_all(['v1', 'v1']))
+    assert v1 == v1_cached
+    assert service.executor.n_submitted == 1
+    asyncio.run(get_all(['v2', 'v1']))
+    assert service.executor.n_submitted == 3
+    assert len(service.cache) == 1
@@ -1,4 +1,11 @@
 from .visualization import vistal
 from .timeline import ColourScheme, Colour
+from .analysis import RenderBudget, analyze_render_cost
+from .comparison import error_temporal_list
+from .model import VistalSubtitle
+from .playlist import vistal_playlist
 
-__all__ = ['vistal', 'ColourScheme', 'Colour']
+__all__ = [
+    'vistal', 'ColourScheme', 'Colour', 'RenderBudget', 'analyze_render_cost',
+    'error_temporal_list', 'VistalSubtitle', 'vistal_playlist'
+]
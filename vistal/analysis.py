@@ -0,0 +1,165 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+import numpy as np
+
+from .subtitle.elements import Time
+from .subtitle.sections import AssSubtitle, Events
+
+__all__ = [
+    'RenderCost',
+    'RenderBudget',
+    'SIMPLIFICATION_LEVELS',
+    'analyze_render_cost',
+]
+
+
+# Timeline arguments applied one level after another to reduce render cost.
+SIMPLIFICATION_LEVELS = [
+    dict(),
+    dict(merge_adjacent=True),
+    dict(merge_adjacent=True, coalesce_rects=True),
+    dict(merge_adjacent=True, coalesce_rects=True, max_label_name_len=8),
+    dict(merge_adjacent=True, coalesce_rects=True, max_label_name_len=0),
+]
+
+
+@dataclass
+class RenderCost:
+    '''
+    Render cost of the events over time. The cost is piecewise constant:
+    between times[i] and times[i+1], there are n_events[i] active events,
+    drawing n_vertices[i] vertices and laying out text_length[i] characters.
+    The peak values and the time they first occur are also recorded.
+    '''
+    times: np.ndarray
+    n_events: np.ndarray
+    n_vertices: np.ndarray
+    text_length: np.ndarray
+    peak_events: int
+    peak_events_time: float
+    peak_vertices: int
+    peak_vertices_time: float
+    peak_text_length: int
+    peak_text_length_time: float
+
+    def __str__(self):
+        return (
+            f'peak events: {self.peak_events} '
+            f'at {Time(self.peak_events_time)}, '
+            f'peak vertices: {self.peak_vertices} '
+            f'at {Time(self.peak_vertices_time)}, '
+            f'peak text length: {self.peak_text_length} '
+            f'at {Time(self.peak_text_length_time)}'
+        )
+
+
+@dataclass
+class RenderBudget:
+    '''
+    Upper limits of the render cost at any instant. None means unlimited.
+    '''
+    max_events: Optional[int] = None
+    max_vertices: Optional[int] = None
+    max_text_length: Optional[int] = None
+
+    def fits(self, cost: RenderCost) -> bool:
+        for limit, peak in (
+            (self.max_events, cost.peak_events),
+            (self.max_vertices, cost.peak_vertices),
+            (self.max_text_length, cost.peak_text_length),
+        ):
+            if limit is not None and peak > limit:
+                return False
+        return True
+
+
+_override_block = re.compile(r'(\{[^}]*\})')
+_drawing_mode = re.compile(r'\\p(\d+)')
+_number = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def _seconds(t: Union[Time, str]) -> float:
+    if isinstance(t, Time):
+        return t.total_seconds
+    hours, minutes, seconds = str(t).split(':')
+    return int(hours)*3600 + int(minutes)*60 + float(seconds)
+
+
+def _text_cost(text):
+    '''
+    Returns (number of drawing vertices, number of text characters) of an
+    event text. Override blocks are not counted as text.
+    '''
+    n_vertices = 0
+    text_length = 0
+    drawing = False
+    for part in _override_block.split(str(text)):
+        if part.startswith('{'):
+            modes = _drawing_mode.findall(part)
+            if modes:
+                drawing = int(modes[-1]) > 0
+        elif drawing:
+            n_vertices += len(_number.findall(part)) // 2
+        else:
+            text_length += len(part)
+    return n_vertices, text_length
+
+
+def analyze_render_cost(events: Union[Events, AssSubtitle]) -> RenderCost:
+    '''
+    Compute how many events are active, how many drawing vertices they contain
+    and how many characters of text they lay out, across the whole timeline.
+
+    Args:
+
+        events: an Events section, or an AssSubtitle containing one.
+
+    Returns:
+
+        A RenderCost instance.
+    '''
+    if isinstance(events, AssSubtitle):
+        events = next(x for x in events.args if isinstance(x, Events))
+
+    starts: List[float] = []
+    ends: List[float] = []
+    costs: List[List[int]] = []
+    for item in events.items:
+        if getattr(item, 'name', None) != 'Dialogue':
+            continue
+        start, end = _seconds(item.Start), _seconds(item.End)
+        if end <= start:
+            continue
+        starts.append(start)
+        ends.append(end)
+        costs.append([1, *_text_cost(item.Text)])
+
+    if not costs:
+        zero = np.zeros(0, dtype=np.int64)
+        return RenderCost(np.zeros(1), zero, zero, zero, 0, 0, 0, 0, 0, 0)
+
+    # Sweep line: add the cost at the start of each event, and subtract it at
+    # the end, then accumulate the deltas in time order.
+    costs = np.array(costs, dtype=np.int64)
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([costs, -costs])
+    times, inverse = np.unique(times, return_inverse=True)
+    summed = np.zeros((len(times), 3), dtype=np.int64)
+    np.add.at(summed, inverse.reshape(-1), deltas)
+    profile = np.cumsum(summed, axis=0)[:-1]
+
+    peaks = profile.argmax(axis=0)
+    return RenderCost(
+        times=times,
+        n_events=profile[:, 0],
+        n_vertices=profile[:, 1],
+        text_length=profile[:, 2],
+        peak_events=int(profile[peaks[0], 0]),
+        peak_events_time=float(times[peaks[0]]),
+        peak_vertices=int(profile[peaks[1], 1]),
+        peak_vertices_time=float(times[peaks[1]]),
+        peak_text_length=int(profile[peaks[2], 2]),
+        peak_text_length_time=float(times[peaks[2]]),
+    )
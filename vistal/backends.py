@@ -0,0 +1,288 @@
+'''
+Output formats of a VistalSubtitle. Besides ASS subtitles, the timelines can
+be exported as compact tracks for players that render them natively, e.g. in
+a web page, instead of parsing ASS drawing commands:
+
+    ASS:    .ass, the subtitle itself.
+    WebVTT: .vtt, plain text cues with the labels of each timeline.
+    JSON:   .json, columnar track, see columnar_tracks.
+    Binary: .vstl, the same columnar track in a little-endian binary layout,
+            see BinaryTrackBackend, read back by load_binary_track.
+
+Use save(sub, path) to choose the format by the file extension.
+'''
+import json
+import struct
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from .model import VistalSubtitle
+from .subtitle.elements import Colour
+from .subtitle.sections import confirm_saving
+
+__all__ = [
+    'Backend',
+    'AssBackend',
+    'WebVttBackend',
+    'JsonTrackBackend',
+    'BinaryTrackBackend',
+    'BACKENDS',
+    'columnar_tracks',
+    'load_binary_track',
+    'save',
+]
+
+
+TRACK_VERSION = 1
+
+
+def css_colour(colour: Colour) -> str:
+    '''
+    '#rrggbbaa' string, with opacity as alpha unlike ASS.
+    '''
+    return f'#{colour.r:02x}{colour.g:02x}{colour.b:02x}{255-colour.alpha:02x}'
+
+
+def columnar_tracks(sub: VistalSubtitle) -> Dict[str, Any]:
+    '''
+    The timelines of a subtitle in a columnar form. The intervals of a
+    timeline are between consecutive boundaries, and the labels of interval i
+    are label_ids[label_offsets[i]:label_offsets[i+1]]. For example:
+
+    {
+        "version": 1, "start": 0, "duration": 6,
+        "timelines": [{
+            "name": "gt",
+            "boundaries": [0, 1, 2],
+            "label_offsets": [0, 1, 3],
+            "label_ids": [0, 0, 1],
+            "labels": {
+                "ids": [0, 1],
+                "names": ["foo", "bar"],
+                "colours": ["#ff0000ff", "#00ff00ff"]
+            }
+        }]
+    }
+
+    Only the labels present in a timeline are in its labels table.
+    '''
+    timelines = []
+    for layout, label_names, colour_scheme in sub.timeline_layouts():
+        sections = [x for fold in layout.sections for x in fold]
+        boundaries = [x[0] for x in sections] + [x[1] for x in sections[-1:]]
+        label_ids = [x[2] for x in sections]
+        label_offsets = np.cumsum([0] + [len(x) for x in label_ids])
+        label_ids = np.concatenate(label_ids or [[]]).astype(int)
+        present = np.unique(label_ids).tolist()
+        timelines.append(dict(
+            name=layout.name,
+            boundaries=np.asarray(boundaries, dtype=float).tolist(),
+            label_offsets=label_offsets.tolist() if sections else [],
+            label_ids=label_ids.tolist(),
+            labels=dict(
+                ids=present,
+                names=[str(label_names[i]) for i in present],
+                colours=[css_colour(colour_scheme[i]) for i in present],
+            ),
+        ))
+    return dict(
+        version=TRACK_VERSION,
+        start=sub.time_offset,
+        duration=sub.video_duration,
+        timelines=timelines,
+    )
+
+
+class Backend:
+    '''
+    Serializes a VistalSubtitle to an output format.
+    '''
+    extension = ''
+    binary = False
+    def serialize(self, sub: VistalSubtitle) -> Union[str, bytes]:
+        raise NotImplementedError
+    def save(
+        self, sub: VistalSubtitle, path: Union[Path, str], *,
+        confirm_overwrite=True
+    ):
+        path = Path(path)
+        if confirm_overwrite and not confirm_saving(path):
+            return
+        if self.binary:
+            path.write_bytes(self.serialize(sub))
+        else:
+            path.write_text(self.serialize(sub), encoding='utf-8')
+        print(f'Subtitle saved to {str(path)}.')
+
+
+class AssBackend(Backend):
+    extension = '.ass'
+    def serialize(self, sub):
+        return str(sub)
+
+
+class WebVttBackend(Backend):
+    '''
+    One cue for each interval of each timeline with any label, reading e.g.
+    "gt: foo, bar", ordered by time. Drawings and colours are not
+    represented.
+    '''
+    extension = '.vtt'
+    @staticmethod
+    def timestamp(seconds):
+        milliseconds = int(round(seconds*1000))
+        hours, milliseconds = divmod(milliseconds, 3600_000)
+        minutes, milliseconds = divmod(milliseconds, 60_000)
+        seconds, milliseconds = divmod(milliseconds, 1000)
+        return f'{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}'
+    def serialize(self, sub):
+        cues = []
+        for layout, label_names, _ in sub.timeline_layouts():
+            for fold in layout.sections:
+                for start, end, label_ids, *_ in fold:
+                    if len(label_ids) == 0:
+                        continue
+                    names = ', '.join(str(label_names[i]) for i in label_ids)
+                    cues.append((start, end, f'{layout.name}: {names}'))
+        # WebVTT requires cues ordered by start time, then by end time
+        cues.sort(key=lambda x: (x[0], x[1]))
+        lines = ['WEBVTT', '']
+        for start, end, text in cues:
+            start = self.timestamp(sub.time_offset + start)
+            end = self.timestamp(sub.time_offset + end)
+            lines.extend([f'{start} --> {end}', text, ''])
+        return '\n'.join(lines)
+
+
+class JsonTrackBackend(Backend):
+    extension = '.json'
+    def serialize(self, sub):
+        return json.dumps(columnar_tracks(sub), separators=(',', ':'))
+
+
+_magic = b'VSTL'
+
+
+def _pack_str(s: str) -> bytes:
+    b = s.encode('utf-8')
+    return struct.pack('<I', len(b)) + b
+
+
+class BinaryTrackBackend(Backend):
+    '''
+    The columnar track of columnar_tracks, in little-endian binary:
+
+        b'VSTL', version u16, start f64, duration f64, n_timelines u32,
+        then for each timeline:
+            name, n_intervals u32, n_label_ids u32, n_labels u32,
+            boundaries f64[n_intervals+1], label_offsets u32[n_intervals+1],
+            label_ids i32[n_label_ids],
+            label table ids i32[n_labels], colours u32[n_labels] (0xRRGGBBAA),
+            names str[n_labels],
+
+    where a str is its UTF-8 length u32 followed by the UTF-8 bytes. Arrays
+    of a timeline without intervals are empty.
+    '''
+    extension = '.vstl'
+    binary = True
+    def serialize(self, sub):
+        tracks = columnar_tracks(sub)
+        res = [
+            _magic,
+            struct.pack(
+                '<HddI', tracks['version'], tracks['start'],
+                tracks['duration'], len(tracks['timelines'])
+            )
+        ]
+        for timeline in tracks['timelines']:
+            labels = timeline['labels']
+            res.append(_pack_str(timeline['name']))
+            res.append(struct.pack(
+                '<III', max(len(timeline['boundaries'])-1, 0),
+                len(timeline['label_ids']), len(labels['ids'])
+            ))
+            res.append(np.asarray(timeline['boundaries'], '<f8').tobytes())
+            res.append(np.asarray(timeline['label_offsets'], '<u4').tobytes())
+            res.append(np.asarray(timeline['label_ids'], '<i4').tobytes())
+            res.append(np.asarray(labels['ids'], '<i4').tobytes())
+            res.append(np.asarray(
+                [int(x[1:], 16) for x in labels['colours']], '<u4'
+            ).tobytes())
+            res.extend(_pack_str(x) for x in labels['names'])
+        return b''.join(res)
+
+
+def load_binary_track(data: bytes) -> Dict[str, Any]:
+    '''
+    Read a binary track back into the form of columnar_tracks.
+    '''
+    if data[:4] != _magic:
+        raise ValueError('Not a vistal binary track.')
+    offset = 4
+    def read(fmt):
+        nonlocal offset
+        values = struct.unpack_from(fmt, data, offset)
+        offset += struct.calcsize(fmt)
+        return values
+    def read_array(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(data, dtype, count, offset)
+        offset += array.nbytes
+        return array.tolist()
+    def read_str():
+        nonlocal offset
+        length, = read('<I')
+        offset += length
+        return data[offset-length:offset].decode('utf-8')
+
+    version, start, duration, n_timelines = read('<HddI')
+    if version != TRACK_VERSION:
+        raise ValueError(f'Unsupported binary track version {version}.')
+    timelines = []
+    for _ in range(n_timelines):
+        name = read_str()
+        n_intervals, n_label_ids, n_labels = read('<III')
+        n_boundaries = n_intervals + 1 if n_intervals > 0 else 0
+        timeline = dict(
+            name=name,
+            boundaries=read_array('<f8', n_boundaries),
+            label_offsets=read_array('<u4', n_boundaries),
+            label_ids=read_array('<i4', n_label_ids),
+        )
+        ids = read_array('<i4', n_labels)
+        colours = [f'#{x:08x}' for x in read_array('<u4', n_labels)]
+        names = [read_str() for _ in range(n_labels)]
+        timeline['labels'] = dict(ids=ids, names=names, colours=colours)
+        timelines.append(timeline)
+    return dict(
+        version=version, start=start, duration=duration, timelines=timelines
+    )
+
+
+BACKENDS: Dict[str, Backend] = {
+    backend.extension: backend
+    for backend in (
+        AssBackend(), WebVttBackend(), JsonTrackBackend(), BinaryTrackBackend()
+    )
+}
+
+
+def save(
+    sub: VistalSubtitle, path: Union[Path, str],
+    backend: Optional[Backend] = None, *, confirm_overwrite=True
+):
+    '''
+    Save the subtitle in the format of backend, or in the format given by the
+    file extension of path if backend is None, see BACKENDS.
+    '''
+    if backend is None:
+        suffix = Path(path).suffix.lower()
+        if suffix not in BACKENDS:
+            raise ValueError(
+                f'Unknown output format \'{suffix}\', '
+                f'expected one of {list(BACKENDS)}.'
+            )
+        backend = BACKENDS[suffix]
+    backend.save(sub, path, confirm_overwrite=confirm_overwrite)
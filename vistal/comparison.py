@@ -0,0 +1,119 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from .subtitle.elements import Colour
+from .timeline import ColourScheme, active_labels
+
+__all__ = [
+    'ERROR_LABEL_NAMES',
+    'ERROR_COLOUR_SCHEME',
+    'agreement_mask',
+    'error_temporal_list',
+]
+
+
+ERROR_MATCH = 0
+ERROR_FALSE_POSITIVE = 1
+ERROR_MISS = 2
+ERROR_WRONG_LABEL = 3
+
+ERROR_LABEL_NAMES = {
+    ERROR_MATCH: 'match',
+    ERROR_FALSE_POSITIVE: 'false positive',
+    ERROR_MISS: 'miss',
+    ERROR_WRONG_LABEL: 'wrong label',
+}
+
+ERROR_COLOUR_SCHEME = ColourScheme(
+    colours=[
+        Colour(b=0,   g=192, r=0),   # match, green
+        Colour(b=0,   g=160, r=255), # false positive, orange
+        Colour(b=0,   g=0,   r=224), # miss, red
+        Colour(b=224, g=0,   r=224), # wrong label, magenta
+    ]
+)
+
+
+def _bounds(temporal_list):
+    if len(temporal_list) == 0:
+        return np.zeros(0), np.zeros(0)
+    starts, ends = list(zip(*temporal_list))[:2]
+    return np.asarray(starts, dtype=float), np.asarray(ends, dtype=float)
+
+
+def agreement_mask(gt_temporal_list, pred_temporal_list):
+    '''
+    Repartition the time dimension by the boundaries of both temporal lists,
+    and compare the label sets of the two lists in each elementary interval,
+    see active_labels.
+
+    Returns:
+
+        timestamps: sorted array of all the boundaries.
+
+        agree: bool array of len(timestamps)-1, whether the two label sets
+        share any label in each interval.
+
+        gt_any, pred_any: bool arrays of len(timestamps)-1, whether there is
+        any label in each interval.
+    '''
+    gt_starts, gt_ends = _bounds(gt_temporal_list)
+    pred_starts, pred_ends = _bounds(pred_temporal_list)
+    timestamps = np.unique(
+        np.concatenate([gt_starts, gt_ends, pred_starts, pred_ends])
+    )
+    gt_labels, _ = active_labels(gt_temporal_list, timestamps)
+    pred_labels, _ = active_labels(pred_temporal_list, timestamps)
+    agree = np.array(
+        [
+            len(a) > 0 and len(b) > 0
+            and not set(a.tolist()).isdisjoint(b.tolist())
+            for a, b in zip(gt_labels, pred_labels)
+        ],
+        dtype=bool
+    )
+    gt_any = np.array([len(x) > 0 for x in gt_labels], dtype=bool)
+    pred_any = np.array([len(x) > 0 for x in pred_labels], dtype=bool)
+    return timestamps, agree, gt_any, pred_any
+
+
+def error_temporal_list(
+    gt_temporal_list, pred_temporal_list
+) -> List[Tuple[float, float, int]]:
+    '''
+    Compare a prediction temporal list to a ground truth temporal list, and
+    return a temporal list whose label IDs are keys of ERROR_LABEL_NAMES. In
+    each interval between the boundaries of both lists:
+
+        match: a label of the ground truth is predicted, other predicted
+        labels, e.g. of overlapping proposals, do not matter.
+
+        wrong label: both lists have labels, but none in common.
+
+        false positive, miss: only the prediction, or only the ground truth,
+        has labels.
+
+    Consecutive intervals of the same kind are merged, and intervals where
+    neither list has a label are left out.
+    '''
+    timestamps, agree, gt_any, pred_any = agreement_mask(
+        gt_temporal_list, pred_temporal_list
+    )
+    kinds = np.full(len(agree), -1)
+    kinds[gt_any & pred_any] = ERROR_WRONG_LABEL
+    kinds[gt_any & ~pred_any] = ERROR_MISS
+    kinds[~gt_any & pred_any] = ERROR_FALSE_POSITIVE
+    kinds[agree] = ERROR_MATCH
+    if len(kinds) == 0:
+        return []
+
+    run_starts = np.flatnonzero(np.r_[True, kinds[1:] != kinds[:-1]])
+    run_ends = np.r_[run_starts[1:], len(kinds)]
+    run_kinds = kinds[run_starts]
+    keep = run_kinds >= 0
+    return list(zip(
+        timestamps[run_starts[keep]].tolist(),
+        timestamps[run_ends[keep]].tolist(),
+        run_kinds[keep].tolist(),
+    ))
@@ -0,0 +1,346 @@
+import copy
+import warnings
+from typing import Dict, List, Optional, Tuple, Union
+
+from .analysis import RenderBudget, SIMPLIFICATION_LEVELS, analyze_render_cost
+from .comparison import (
+    ERROR_COLOUR_SCHEME, ERROR_LABEL_NAMES, error_temporal_list
+)
+from .subtitle.elements import Colour
+from .subtitle.sections import (
+    ScriptInfo, V4plusStyles, EventItem, Events, AssSubtitle
+)
+from .timeline import (
+    MONOSPACE_CHAR_WIDTH,
+    ColourScheme,
+    ColourSchemeLegend,
+    WindowedColourSchemeLegend,
+    TimelinePositionCalculator,
+    TimelineLayout,
+    layout_timeline,
+    has_scores,
+    Timeline
+)
+
+__all__ = ['VistalSubtitle']
+
+
+class VistalSubtitle(AssSubtitle):
+    '''
+    An editable AssSubtitle, as returned by vistal. Timelines can be replaced,
+    added or removed by name, and the legend can be changed. Serialized text
+    of each timeline and of the legend is cached, so after an edit only the
+    changed parts are generated again.
+
+    Timelines are stacked from the bottom in the order they are added.
+    Removing a timeline moves the timelines above it down, so these are
+    generated again as well.
+    '''
+    def __init__(
+        self, script_info: ScriptInfo, styles: V4plusStyles,
+        tl_pos_cal: TimelinePositionCalculator,
+        legend_pos_cal: TimelinePositionCalculator,
+        video_duration: Union[int, float],
+        n_fold: int,
+        background_colour: Colour,
+        drawing_scale: Optional[int] = None,
+        compact_text: bool = False,
+        max_shown_labels: Optional[int] = None,
+        time_offset: Union[int, float] = 0,
+        char_width: float = MONOSPACE_CHAR_WIDTH,
+    ):
+        self.script_info = script_info
+        self.styles = styles
+        self.tl_pos_cal = tl_pos_cal
+        self.legend_pos_cal = legend_pos_cal
+        self.video_duration = video_duration
+        self.n_fold = n_fold
+        self.background_colour = background_colour
+        self.drawing_scale = drawing_scale
+        self.compact_text = compact_text
+        self.max_shown_labels = max_shown_labels
+        self.time_offset = time_offset
+        self.char_width = char_width
+        self.simplification = {}
+
+        # name -> (temporal_list, label_names, colour_scheme)
+        self._sources: Dict[str, Tuple] = {}
+        # name -> (gt_name, pred_name, colour_scheme) for error timelines
+        self._errors: Dict[str, Tuple[str, str, ColourScheme]] = {}
+        self._order: List[str] = []
+        self._legend_colour_scheme: Optional[ColourScheme] = None
+        self._legend_window: Optional[Union[int, float]] = None
+        self._legend_max_entries: Optional[int] = None
+
+        # name -> (idx, layout, (temporal_list, label_names, colour_scheme))
+        self._layout_cache: Dict[str, Tuple[int, TimelineLayout, Tuple]] = {}
+        # name -> (idx, event items, serialized text)
+        self._timeline_cache: Dict[str, Tuple[int, List[EventItem], str]] = {}
+        self._legend_cache: Optional[Tuple[List[EventItem], str]] = None
+        self._header = '\n'.join([
+            str(self.script_info),
+            str(self.styles),
+            f'[{Events.name}]\n{EventItem("Format")}',
+        ])
+
+    @property
+    def timeline_names(self) -> List[str]:
+        return list(self._order)
+
+    @property
+    def args(self):
+        return (self.script_info, self.styles, self.events())
+
+    def set_timeline(
+        self, name: str, temporal_list: List[Tuple],
+        label_names: Union[Dict[int, str], List[str]],
+        colour_scheme: ColourScheme,
+    ):
+        '''
+        Replace the timeline of this name, or add it on top if it does not
+        exist. Error timelines comparing against it are updated as well.
+        '''
+        self._errors.pop(name, None)
+        self._sources[name] = (temporal_list, label_names, colour_scheme)
+        self._touch(name)
+
+    def set_error_timeline(
+        self, name: str, gt_name: str, pred_name: str,
+        colour_scheme: Optional[ColourScheme] = None,
+    ):
+        '''
+        Replace or add a timeline showing where the timeline pred_name
+        disagrees with the timeline gt_name.
+        '''
+        for source in (gt_name, pred_name):
+            if source not in self._sources:
+                raise KeyError(f'No timeline named \'{source}\' to compare.')
+        if name in (gt_name, pred_name):
+            raise ValueError(
+                f'Error timeline \'{name}\' cannot replace a timeline it '
+                f'compares.'
+            )
+        self._check_not_compared(name)
+        if colour_scheme is None:
+            colour_scheme = ERROR_COLOUR_SCHEME
+        self._sources.pop(name, None)
+        self._errors[name] = (gt_name, pred_name, colour_scheme)
+        self._touch(name)
+
+    def remove_timeline(self, name: str):
+        '''
+        Remove the timeline of this name.
+        '''
+        self._check_not_compared(name)
+        if name not in self._order:
+            raise KeyError(f'No timeline named \'{name}\'.')
+        self._sources.pop(name, None)
+        self._errors.pop(name, None)
+        self._invalidate(name)
+        self._order.remove(name)
+        if self._legend_window is not None:
+            self._legend_cache = None
+
+    def set_legend(
+        self, colour_scheme: Optional[ColourScheme],
+        window: Optional[Union[int, float]] = None,
+        max_entries: Optional[int] = None,
+    ):
+        '''
+        Show the legend of this colour scheme, or hide the legend if None.
+        If window is given, only the labels present in the timelines within
+        each window of this many seconds are shown, at most max_entries of
+        them, see WindowedColourSchemeLegend.
+        '''
+        self._legend_colour_scheme = colour_scheme
+        self._legend_window = window
+        self._legend_max_entries = max_entries
+        self._legend_cache = None
+
+    def set_simplification(self, **simplification):
+        '''
+        Set the simplification arguments passed to all the Timelines, see
+        SIMPLIFICATION_LEVELS in vistal.analysis. All timelines are generated
+        again.
+        '''
+        self.simplification = simplification
+        self._layout_cache.clear()
+        self._timeline_cache.clear()
+
+    def fit_render_budget(self, render_budget: RenderBudget):
+        '''
+        Simplify the timelines step by step, see SIMPLIFICATION_LEVELS in
+        vistal.analysis, until the peak render cost fits in the budget. A
+        warning is issued if it never fits.
+        '''
+        for simplification in SIMPLIFICATION_LEVELS:
+            self.set_simplification(**simplification)
+            cost = analyze_render_cost(self)
+            if render_budget.fits(cost):
+                return
+        warnings.warn(
+            f'Render budget is exceeded after all simplifications, {cost}.'
+        )
+
+    def new_clip(
+        self, video_duration: Union[int, float], time_offset: Union[int, float]
+    ) -> 'VistalSubtitle':
+        '''
+        Returns a VistalSubtitle without timelines, sharing the styles, layout
+        and legend settings of this one, for a clip of video_duration seconds
+        starting at time_offset seconds, e.g. in a playlist.
+        '''
+        clip = copy.copy(self)
+        clip.video_duration = video_duration
+        clip.time_offset = time_offset
+        clip._sources = {}
+        clip._errors = {}
+        clip._order = []
+        clip._layout_cache = {}
+        clip._timeline_cache = {}
+        clip._legend_cache = None
+        return clip
+
+    def _check_not_compared(self, name):
+        for error_name, (gt_name, pred_name, _) in self._errors.items():
+            if name in (gt_name, pred_name):
+                raise ValueError(
+                    f'Timeline \'{name}\' is compared in error timeline '
+                    f'\'{error_name}\', remove that first.'
+                )
+
+    def _touch(self, name):
+        if name not in self._order:
+            self._order.append(name)
+        self._invalidate(name)
+        if self._legend_window is not None:
+            self._legend_cache = None
+        for error_name, (gt_name, pred_name, _) in self._errors.items():
+            if name in (gt_name, pred_name):
+                self._invalidate(error_name)
+
+    def _invalidate(self, name):
+        self._layout_cache.pop(name, None)
+        self._timeline_cache.pop(name, None)
+
+    def _source(self, name):
+        '''
+        Returns the temporal list, label names and colour scheme of a timeline.
+        '''
+        if name in self._errors:
+            gt_name, pred_name, colour_scheme = self._errors[name]
+            temporal_list = error_temporal_list(
+                self._sources[gt_name][0], self._sources[pred_name][0]
+            )
+            return temporal_list, ERROR_LABEL_NAMES, colour_scheme
+        return self._sources[name]
+
+    def _layout(self, idx, name):
+        '''
+        Returns the layout of a timeline and its source, see _source.
+        '''
+        cached = self._layout_cache.get(name)
+        if cached is not None and cached[0] == idx:
+            return cached[1:]
+        source = self._source(name)
+        with_scores = (
+            self.max_shown_labels is not None and has_scores(source[0])
+        )
+        layout = layout_timeline(
+            name, self.tl_pos_cal, idx, source[0], self.video_duration,
+            self.n_fold, self.simplification.get('merge_adjacent', False),
+            with_scores
+        )
+        self._layout_cache[name] = (idx, layout, source)
+        return layout, source
+
+    def _timeline(self, idx, name):
+        cached = self._timeline_cache.get(name)
+        if cached is not None and cached[0] == idx:
+            return cached
+        layout, (temporal_list, label_names, colour_scheme) = self._layout(
+            idx, name
+        )
+        items = list(Timeline(
+            name, self.tl_pos_cal, idx, temporal_list, self.video_duration,
+            label_names, colour_scheme, self.n_fold, self.background_colour,
+            drawing_scale=self.drawing_scale, compact_text=self.compact_text,
+            char_width=self.char_width, max_shown_labels=self.max_shown_labels,
+            time_offset=self.time_offset, layout=layout, **self.simplification
+        ))
+        cached = (idx, items, '\n'.join(str(item) for item in items))
+        self._timeline_cache[name] = cached
+        return cached
+
+    def timeline_layouts(self) -> List[Tuple[
+        TimelineLayout, Union[Dict[int, str], List[str]], ColourScheme
+    ]]:
+        '''
+        Returns the layout, label names and colour scheme of each timeline,
+        for output formats other than ASS, see vistal.backends. Layouts are
+        cached and shared with the ASS events.
+        '''
+        res = []
+        for idx, name in enumerate(self._order):
+            layout, (_, label_names, colour_scheme) = self._layout(idx, name)
+            res.append((layout, label_names, colour_scheme))
+        return res
+
+    def _legend(self):
+        if self._legend_colour_scheme is None:
+            return [], ''
+        if self._legend_cache is None:
+            if self._legend_window is None:
+                legend = ColourSchemeLegend(
+                    self._legend_colour_scheme, self.time_offset,
+                    self.time_offset + self.video_duration,
+                    self.legend_pos_cal, self.drawing_scale
+                )
+            else:
+                legend = WindowedColourSchemeLegend(
+                    self._legend_colour_scheme,
+                    [x[0] for x in self._sources.values()],
+                    self.video_duration, self.legend_pos_cal,
+                    self._legend_window, self._legend_max_entries,
+                    self.drawing_scale, self.time_offset
+                )
+            items = list(legend)
+            self._legend_cache = (items, '\n'.join(str(x) for x in items))
+        return self._legend_cache
+
+    def events(self) -> Events:
+        '''
+        Returns all the event items in an Events section.
+        '''
+        es = Events()
+        for idx, name in enumerate(self._order):
+            for item in self._timeline(idx, name)[1]:
+                es.append_item(item)
+        for item in self._legend()[0]:
+            es.append_item(item)
+        return es
+
+    @property
+    def header(self) -> str:
+        '''
+        Script info, styles and the beginning of the events section.
+        '''
+        return self._header
+
+    def events_text(self) -> str:
+        '''
+        Returns the serialized event items, one per line.
+        '''
+        blocks = []
+        for idx, name in enumerate(self._order):
+            blocks.append(self._timeline(idx, name)[2])
+        legend_text = self._legend()[1]
+        if legend_text:
+            blocks.append(legend_text)
+        return '\n'.join(blocks)
+
+    def __str__(self):
+        events_text = self.events_text()
+        if not events_text:
+            return self._header + '\n'
+        return self._header + '\n' + events_text + '\n'
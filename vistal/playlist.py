@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from .analysis import RenderBudget
+from .model import VistalSubtitle
+from .subtitle.sections import confirm_saving
+from .timeline import ColourScheme
+from .visualization import vistal
+
+__all__ = ['vistal_playlist']
+
+
+def generate_clip(
+    template: VistalSubtitle,
+    clip: Tuple[Union[int, float], Union[int, float], Dict[str, List[Tuple]]],
+    label_names: Union[Dict[int, str], List[str]],
+    colour_scheme: ColourScheme,
+    error_timeline_dict: Optional[Dict[str, Tuple[str, str]]],
+    error_colour_scheme: Optional[ColourScheme],
+    render_budget: Optional[RenderBudget],
+) -> str:
+    '''
+    Returns the serialized events of one clip. Runs in the worker pool.
+    '''
+    clip_offset, clip_duration, temporal_list_dict = clip
+    sub = template.new_clip(clip_duration, clip_offset)
+    for name, temporal_list in temporal_list_dict.items():
+        sub.set_timeline(name, temporal_list, label_names, colour_scheme)
+    if error_timeline_dict is not None:
+        for name, (gt_name, pred_name) in error_timeline_dict.items():
+            sub.set_error_timeline(name, gt_name, pred_name, error_colour_scheme)
+    if render_budget is not None:
+        sub.fit_render_budget(render_budget)
+    return sub.events_text()
+
+
+def vistal_playlist(
+    clips: List[Tuple[
+        Union[int, float], Union[int, float], Dict[str, List[Tuple]]
+    ]],
+    path: Union[Path, str],
+    label_names: Union[Dict[int, str], List[str]],
+    colour_scheme: ColourScheme,
+    *,
+    error_timeline_dict: Optional[Dict[str, Tuple[str, str]]] = None,
+    error_colour_scheme: Optional[ColourScheme] = None,
+    render_budget: Optional[RenderBudget] = None,
+    max_workers: Optional[int] = None,
+    confirm_overwrite: bool = True,
+    **kwargs
+):
+    '''
+    Create one subtitle for a playlist of clips concatenated into one video,
+    and save it to an .ass file.
+
+    The styles and the layout are computed once for all the clips. The events
+    of the clips are generated in parallel and written to the file in order,
+    as soon as each clip is done.
+
+    Args:
+
+        clips: list of tuple(clip_offset, clip_duration, temporal_list_dict),
+        where clip_offset is the starting second of the clip in the playlist,
+        clip_duration is its duration in seconds, and temporal_list_dict is as
+        in vistal, with times relative to the start of the clip.
+
+        path: pathlib.Path or str, the path of the file to save.
+
+        label_names, colour_scheme, error_timeline_dict, error_colour_scheme,
+        render_budget: as in vistal, applied to each clip.
+
+        max_workers: optional int, number of worker processes. Clips are
+        generated in this process if it is 1.
+
+        confirm_overwrite: optional bool, whether confirmation is needed before
+        overwriting existing file.
+
+        kwargs: other keyword arguments for vistal, e.g. display size, fonts
+        and legend options. The legend is shown for each clip separately.
+    '''
+    path = Path(path)
+    if confirm_overwrite and not confirm_saving(path):
+        return
+
+    playlist_duration = max(
+        [offset + duration for offset, duration, _ in clips], default=0
+    )
+    template = vistal(
+        {}, label_names, colour_scheme, playlist_duration, **kwargs
+    )
+    args = (
+        repeat(template), clips, repeat(label_names), repeat(colour_scheme),
+        repeat(error_timeline_dict), repeat(error_colour_scheme),
+        repeat(render_budget),
+    )
+
+    executor = None if max_workers == 1 else ProcessPoolExecutor(max_workers)
+    try:
+        with open(path, 'w') as f:
+            f.write(template.header)
+            if executor is None:
+                results = map(generate_clip, *args)
+            else:
+                results = executor.map(generate_clip, *args)
+            for events_text in results:
+                if events_text:
+                    f.write('\n' + events_text)
+            f.write('\n')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print(f'Subtitle saved to {str(path)}.')
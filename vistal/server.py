@@ -0,0 +1,270 @@
+'''
+A small asyncio HTTP service generating subtitles on demand, e.g. for an
+annotation review web app. Only the standard library is needed.
+
+Inputs are read from a local directory, one JSON file per video:
+
+    <root>/<video_id>.json
+    {
+        "video_duration": 30,
+        "temporal_list_dict": {"gt": [[0, 3, 0], ...], "pred": [...]},
+        "label_names": {"0": "foo", ...}
+    }
+
+Any other key is passed to vistal as a keyword argument, overriding the
+defaults of the service. GET /<video_id>.ass responds with the subtitle.
+
+Run with: python -m vistal.server <root> [--host HOST] [--port PORT]
+'''
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import re
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from urllib.parse import unquote
+
+from .timeline import ColourScheme
+from .visualization import vistal
+
+__all__ = ['LocalStore', 'SubtitleService', 'serve']
+
+
+_video_id_pattern = re.compile(r'[\w\-. ]+')
+
+
+class LocalStore:
+    def __init__(self, root: Union[Path, str]):
+        '''
+        Predictions stored in a local directory, as <root>/<video_id>.json.
+        '''
+        self.root = Path(root)
+    def path(self, video_id: str) -> Path:
+        if (
+            not _video_id_pattern.fullmatch(video_id)
+            or video_id.startswith('.')
+        ):
+            raise ValueError(f'Invalid video ID \'{video_id}\'.')
+        return self.root / f'{video_id}.json'
+    def read(self, video_id: str) -> bytes:
+        '''
+        Returns the raw content of the stored file, raises FileNotFoundError
+        if missing.
+        '''
+        return self.path(video_id).read_bytes()
+
+
+def parse_input(content: bytes) -> Dict[str, Any]:
+    '''
+    Convert the content of a stored JSON file to vistal keyword arguments.
+    '''
+    kwargs = json.loads(content)
+    kwargs['temporal_list_dict'] = {
+        name: [tuple(x) for x in temporal_list]
+        for name, temporal_list in kwargs['temporal_list_dict'].items()
+    }
+    label_names = kwargs.get('label_names')
+    if isinstance(label_names, dict):
+        kwargs['label_names'] = {int(k): v for k, v in label_names.items()}
+    return kwargs
+
+
+def generate(content: bytes, defaults: Dict[str, Any]) -> bytes:
+    '''
+    Generate the subtitle of a stored JSON file. Runs in the worker pool.
+    '''
+    kwargs = {**defaults, **parse_input(content)}
+    if kwargs.get('colour_scheme') is None:
+        label_names = kwargs['label_names']
+        # colour schemes are indexed by label ID, which may be sparse in a dict
+        if isinstance(label_names, dict):
+            n_colours = max(label_names, default=-1) + 1
+        else:
+            n_colours = len(label_names)
+        kwargs['colour_scheme'] = ColourScheme(n_colours=n_colours)
+    return str(vistal(**kwargs)).encode('utf-8')
+
+
+def new_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    '''
+    Worker processes are spawned rather than forked: a forked worker would
+    inherit the open client sockets, and the clients would never see the
+    connections closed.
+    '''
+    return ProcessPoolExecutor(
+        max_workers, mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+class SubtitleService:
+    def __init__(
+        self, store: LocalStore, *,
+        executor: Optional[Executor] = None,
+        cache_size: int = 64,
+        **defaults
+    ):
+        '''
+        Generate subtitles for stored videos in a worker pool, and keep the
+        finished ones in a LRU cache keyed by the hash of the input.
+
+        Args:
+
+            store: LocalStore to read inputs from.
+
+            executor: optional concurrent.futures Executor to generate in, a
+            ProcessPoolExecutor in default, see new_process_pool.
+
+            cache_size: maximum number of subtitles in the cache.
+
+            defaults: keyword arguments for vistal, overridden by the stored
+            inputs. They must be picklable for a ProcessPoolExecutor.
+        '''
+        self.store = store
+        self.executor = executor or new_process_pool()
+        self.cache_size = cache_size
+        self.defaults = defaults
+        self.cache: 'OrderedDict[str, bytes]' = OrderedDict()
+        self.pending: Dict[str, asyncio.Future] = {}
+    async def get(self, video_id: str) -> bytes:
+        '''
+        Returns the subtitle of a video as UTF-8 bytes. Raises
+        FileNotFoundError if the video is not in the store, ValueError if the
+        video ID is invalid.
+        '''
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, self.store.read, video_id)
+        key = hashlib.sha256(content).hexdigest()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        # Requests arriving during the generation share it.
+        if key not in self.pending:
+            self.pending[key] = loop.run_in_executor(
+                self.executor, generate, content, self.defaults
+            )
+        try:
+            subtitle = await asyncio.shield(self.pending[key])
+        finally:
+            if key in self.pending and self.pending[key].done():
+                del self.pending[key]
+        self.cache[key] = subtitle
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return subtitle
+    def close(self):
+        self.executor.shutdown()
+
+
+_reasons = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 500: 'Internal Server Error',
+}
+
+
+async def _respond(writer, status, body: bytes, content_type, chunk_size):
+    head = (
+        f'HTTP/1.1 {status} {_reasons[status]}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        f'Connection: close\r\n\r\n'
+    )
+    writer.write(head.encode('latin-1'))
+    for i in range(0, len(body), chunk_size):
+        writer.write(body[i:i+chunk_size])
+        await writer.drain()
+    await writer.drain()
+
+
+def make_handler(service: SubtitleService, chunk_size: int = 1 << 16):
+    '''
+    Returns a client connection callback for asyncio.start_server or
+    asyncio.start_unix_server, serving GET /<video_id>.ass.
+    '''
+    async def handle(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass # headers are not used
+            parts = request_line.split()
+            if len(parts) < 2:
+                status, body = 400, b'Bad request.'
+            elif parts[0] != 'GET':
+                status, body = 405, b'Only GET is supported.'
+            elif not parts[1].endswith('.ass'):
+                status, body = 404, b'Not found.'
+            else:
+                video_id = unquote(parts[1].lstrip('/')[:-len('.ass')])
+                try:
+                    service.store.path(video_id)
+                    status, body = 200, await service.get(video_id)
+                except ValueError as e:
+                    status, body = 400, str(e).encode()
+                except FileNotFoundError:
+                    status, body = 404, b'Not found.'
+                except Exception as e:
+                    status, body = 500, f'{type(e).__name__}: {e}'.encode()
+            content_type = (
+                'text/x-ssa; charset=utf-8' if status == 200
+                else 'text/plain; charset=utf-8'
+            )
+            await _respond(writer, status, body, content_type, chunk_size)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(
+    root: Union[Path, str], host: str = '127.0.0.1', port: int = 8000, *,
+    unix_path: Optional[Union[Path, str]] = None,
+    max_workers: Optional[int] = None,
+    cache_size: int = 64,
+    **defaults
+):
+    '''
+    Serve the subtitles of the videos stored in root forever, over TCP at
+    host:port, or over a Unix socket at unix_path if given.
+    '''
+    service = SubtitleService(
+        LocalStore(root),
+        executor=new_process_pool(max_workers),
+        cache_size=cache_size,
+        **defaults
+    )
+    handler = make_handler(service)
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(handler, str(unix_path))
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve vistal subtitles of locally stored predictions.'
+    )
+    parser.add_argument('root', help='directory of <video_id>.json files')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix', help='serve on this Unix socket instead')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache-size', type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(serve(
+        args.root, args.host, args.port, unix_path=args.unix,
+        max_workers=args.workers, cache_size=args.cache_size,
+    ))
+
+
+if __name__ == '__main__':
+    main()
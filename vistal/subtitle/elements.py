@@ -1,6 +1,10 @@
+import math
 from typing import Any, List, Union, Optional
 
-__all__ = ['DialogueText', 'Rectangle', 'Move', 'Position', 'Colour', 'Time']
+__all__ = [
+    'DialogueText', 'Rectangle', 'Drawing', 'Move', 'Position', 'Colour',
+    'Time', 'local_drawing'
+]
 
 
 class DialogueText:
@@ -61,6 +65,11 @@ class Time:
 
         self.seconds = int(total_seconds)
         self.centiseconds = round((total_seconds - self.seconds)*100)
+        # carry a fraction rounded up to a whole second, so that e.g. 1.999 is
+        # 0:00:02.00 rather than 0:00:01.100
+        if self.centiseconds == 100:
+            self.seconds += 1
+            self.centiseconds = 0
         self.hours = self.seconds // 3600
         self.minutes = (self.seconds % 3600) // 60
         self.seconds = self.seconds % 60
@@ -85,26 +94,69 @@ class Point:
 
 
 class Rectangle(DialogueText):
-    def __init__(self, x, y, w, h):
+    def __init__(self, x, y, w, h, scale: Optional[int] = None):
+        '''
+        A rectangle drawing.
+
+        Args:
+
+            scale: optional int, the drawing scale level. If given, the compact
+            encoding is used: coordinates are integers in units of
+            1/2^(scale-1) pixel, e.g. quarter pixels for scale 3, and the
+            line command is given once for all the corners. Otherwise
+            coordinates are rounded to whole pixels. See also local_drawing
+            for keeping the coordinates short.
+        '''
         super().__init__()
+        if scale is not None and scale < 1:
+            raise ValueError('Drawing scale level must be at least 1.')
         self.x = x
         self.y = y
         self.w = w
         self.h = h
+        self.scale = scale
         self.top_left  = Point(self.x,        self.y)
         self.top_right = Point(self.x+self.w, self.y)
         self.bot_left  = Point(self.x,        self.y+self.h)
         self.bot_right = Point(self.x+self.w, self.y+self.h)
-    def __str__(self):
+    def path(self):
+        '''
+        Drawing commands of the rectangle, without the drawing mode tags.
+        '''
+        if self.scale is not None:
+            k = 2**(self.scale-1)
+            return (
+                f'm {self.top_left*k} '
+                f'l {self.top_right*k} {self.bot_right*k} {self.bot_left*k}'
+            )
         res = ''
-        res += f'{{\\p1}}'
         res += f'm {self.top_left} '
         res += f'l {self.top_right} '
         res += f'l {self.bot_right} '
         res += f'l {self.bot_left} '
         res += f'c'
-        res += f'{{\\p0}}'
         return res
+    def moved(self, dx, dy) -> 'Rectangle':
+        return Rectangle(self.x+dx, self.y+dy, self.w, self.h, self.scale)
+    def __str__(self):
+        return f'{{\\p{self.scale or 1}}}{self.path()}{{\\p0}}'
+
+
+class Drawing(DialogueText):
+    '''
+    A single drawing made of several shapes, e.g. all the rectangles sharing a
+    colour. Unlike concatenating the shapes' strings, the shapes are kept in
+    one drawing block and thus in the same coordinate space. All the shapes
+    must have the same scale.
+    '''
+    def __init__(self, shapes: List[Rectangle]):
+        super().__init__()
+        self.shapes = shapes
+    def __str__(self):
+        path = ' '.join(shape.path() for shape in self.shapes)
+        scale = self.shapes[0].scale if self.shapes else None
+        return f'{{\\p{scale or 1}}}{path}{{\\p0}}'
+
 
 
 class Move(DialogueText):
@@ -125,3 +177,23 @@ class Position(DialogueText):
         self.y = y
     def __str__(self):
         return f'{{\\pos({self.x}, {self.y})}}'
+
+
+def local_drawing(shapes: List[Rectangle], colour: Optional[Colour] = None):
+    '''
+    A position tag, the colour tag if given, and a drawing of the rectangles.
+    Rectangles with a drawing scale are moved to a local origin at the top
+    left whole pixel of all of them, given by the position tag, so that their
+    coordinates are small numbers rather than absolute coordinates multiplied
+    by the scale. Otherwise the drawing is at (0, 0) with absolute
+    coordinates.
+    '''
+    x, y = 0, 0
+    if shapes and shapes[0].scale is not None:
+        x = math.floor(min(shape.x for shape in shapes))
+        y = math.floor(min(shape.y for shape in shapes))
+        shapes = [shape.moved(-x, -y) for shape in shapes]
+    res = Position(x, y)
+    if colour is not None:
+        res += colour
+    return res + Drawing(shapes)
@@ -105,6 +105,11 @@ class EventItem(Item):
         MarginL = 0, MarginR = 0, MarginV = 0, Effect = '',
         Text: Union[str, DialogueText] = '',
     ):
+        self.Layer = Layer
+        self.Start = Start
+        self.End = End
+        self.Style = Style
+        self.Text = Text
         if name == 'Format':
             value = f'Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text'
         else:
@@ -119,6 +124,18 @@ class Events(Section):
         self.append_item(EventItem('Format'))
 
 
+def confirm_saving(path: Path) -> bool:
+    '''
+    Ask for confirmation if the file exists, returns whether to save.
+    '''
+    if path.exists():
+        confirm = input(f'\'{str(path)}\' exists, overwrite? [y/n]: ')
+        if confirm != 'y':
+            print('Quit saving.')
+            return False
+    return True
+
+
 class AssSubtitle:
     '''
     Contains an ASS subtitle. Apply str function to get the content in string form. Apply save method to save to a file.
@@ -138,11 +155,8 @@ class AssSubtitle:
             confirm_overwrite: optional bool, whether confirmation is needed before overwriting existing file.
         '''
         path = Path(path)
-        if path.exists() and confirm_overwrite:
-            confirm = input(f'\'{str(path)}\' exists, overwrite? [y/n]: ')
-            if confirm != 'y':
-                print('Quit saving.')
-                return
+        if confirm_overwrite and not confirm_saving(path):
+            return
         with open(path, 'w') as f:
             f.write(str(self))
             print(f'Subtitle saved to {str(path)}.')
@@ -1,23 +1,36 @@
+from collections import Counter
 from dataclasses import dataclass
-from typing import List, Optional, Union
+from itertools import repeat
+from typing import List, Optional, Tuple, Union
 
 from distinctipy import get_colors
 
-from .subtitle.elements import Rectangle, Move, Position, Time, Colour
+from .subtitle.elements import (
+    Rectangle, Move, Position, Time, Colour, local_drawing
+)
 from .subtitle.sections import EventItem
 
 __all__ = [
     'get_inline_rectangle',
     'ColourScheme',
     'ColourSchemeLegend',
+    'WindowedColourSchemeLegend',
     'TimelinePosition',
     'TimelinePositionCalculator',
+    'TimelineLayout',
+    'layout_timeline',
     'Timeline'
 ]
 
 
-def get_inline_rectangle(font_size):
-    return Rectangle(0, font_size/10, font_size/1.3, font_size/1.3)
+# Default character width of monospace fonts relative to the font size, for
+# placing texts after the timeline names. It suits Ubuntu Mono, while e.g.
+# Roboto Mono, Monaco and Cascadia Mono are about 0.6.
+MONOSPACE_CHAR_WIDTH = 0.5
+
+
+def get_inline_rectangle(font_size, scale=None):
+    return Rectangle(0, font_size/10, font_size/1.3, font_size/1.3, scale)
 
 
 class ColourScheme:
@@ -152,11 +165,99 @@ class EventItemContainer:
 
 import numpy as np
 
-def temporal_repartition(temporal_list, n_fold, video_duration):
+def _columns(temporal_list, n_columns=3):
+    '''
+    Columns of a temporal list as arrays: starts, ends, label_ids and, if
+    n_columns is 4, scores. Sections without scores have a score of 0.
+    '''
+    if len(temporal_list) == 0:
+        return np.zeros((n_columns, 0))
+    columns = list(zip(*[x[:3] for x in temporal_list]))
+    if n_columns > 3:
+        columns.append([x[3] if len(x) > 3 else 0 for x in temporal_list])
+    return [np.asarray(x) for x in columns]
+
+
+def has_scores(temporal_list):
+    return any(len(x) > 3 for x in temporal_list)
+
+
+def active_labels(temporal_list, timestamps, with_scores=False):
+    '''
+    The sorted label IDs of the sections covering each elementary interval
+    between consecutive timestamps, as a list of len(timestamps)-1 arrays.
+    All the section boundaries must be among the sorted timestamps. If
+    with_scores, also returns the highest score of each of these labels in
+    each interval, in the same form, otherwise None.
+
+    The section boundaries are swept in time order with a running count of
+    the active labels, so memory grows with the labels actually present in
+    each interval rather than with the whole vocabulary. Consecutive
+    intervals with the same labels share their arrays.
+    '''
+    starts, ends, label_ids, scores = _columns(temporal_list, 4)
+    valid = starts < ends
+    label_ids = label_ids[valid].astype(int).tolist()
+    scores = scores[valid].tolist() if with_scores else repeat(0)
+    i_starts = np.searchsorted(timestamps, starts[valid]).tolist()
+    i_ends = np.searchsorted(timestamps, ends[valid]).tolist()
+    events = sorted(
+        [
+            *zip(i_starts, repeat(1), label_ids, scores),
+            *zip(i_ends, repeat(-1), label_ids, scores),
+        ] if with_scores else [
+            *zip(i_starts, repeat(1), label_ids),
+            *zip(i_ends, repeat(-1), label_ids),
+        ],
+        key=lambda x: x[0]
+    )
+
+    # label ID -> number of active sections, or Counter of their scores
+    active = {}
+    current_labels, current_scores = np.zeros(0, dtype=int), np.zeros(0)
+    res_labels, res_scores = [], []
+    j = 0
+    for i in range(len(timestamps)-1):
+        changed = False
+        while j < len(events) and events[j][0] == i:
+            if with_scores:
+                _, delta, label_id, score = events[j]
+                counts = active.setdefault(label_id, Counter())
+                counts[score] += delta
+                if counts[score] == 0:
+                    del counts[score]
+                    if not counts:
+                        del active[label_id]
+            else:
+                _, delta, label_id = events[j]
+                count = active.get(label_id, 0) + delta
+                if count == 0:
+                    del active[label_id]
+                else:
+                    active[label_id] = count
+            changed = True
+            j += 1
+        if changed:
+            labels = sorted(active)
+            current_labels = np.array(labels, dtype=int)
+            if with_scores:
+                current_scores = np.array(
+                    [max(active[x]) for x in labels], dtype=float
+                )
+        res_labels.append(current_labels)
+        res_scores.append(current_scores)
+    return res_labels, res_scores if with_scores else None
+
+
+def temporal_repartition(
+    temporal_list, n_fold, video_duration, with_scores=False
+):
     '''
     Handles overlaps between sections. Repartition the time dimension into
     disjoint parts, each associated with a list of label IDs and then devide
-    into equal n_fold parts with equal durations. For example:
+    into equal n_fold parts with equal durations. If with_scores, each part
+    also has the highest scores of its labels, see active_labels.
+    For example:
     temporal_repartition([
         (1, 3, 0),
         (2, 4, 1),
@@ -171,29 +272,80 @@ def temporal_repartition(temporal_list, n_fold, video_duration):
     new_temporal_list = []
     div_points = [video_duration * i / n_fold for i in range(1, n_fold)]
     timestamps = [i for i in div_points] # a deep copy
-    for start, end, label_id in temporal_list:
+    for start, end, *_ in temporal_list:
         timestamps.append(start)
         timestamps.append(end)
     timestamps = np.unique(timestamps)
-    for start, end in zip(timestamps[:-1], timestamps[1:]):
-        middle = (start+end)/2
-        middle_label_ids = []
-        for start_0, end_0, label_id_0 in temporal_list:
-            if start_0 <= middle < end_0:
-                middle_label_ids.append(label_id_0)
-        new_temporal_list.append((start,end,np.unique(middle_label_ids)))
+    labels, scores = active_labels(temporal_list, timestamps, with_scores)
+    for i, (start, end) in enumerate(zip(timestamps[:-1], timestamps[1:])):
+        if with_scores:
+            new_temporal_list.append((start, end, labels[i], scores[i]))
+        else:
+            new_temporal_list.append((start, end, labels[i]))
 
     div_parts_start = [0] + div_points
     i_fold = 0
     new_temporal_list_folded = [[] for _ in range(n_fold)]
     for i in new_temporal_list:
-        start, end, label_ids = i
+        start, end = i[:2]
         if i_fold < n_fold-1 and (start+end)/2 >= div_parts_start[i_fold+1]:
             i_fold += 1
         new_temporal_list_folded[i_fold].append(i)
     return new_temporal_list_folded
 
 
+def merge_adjacent_sections(temporal_list_rep):
+    '''
+    Merge consecutive sections of a repartitioned temporal list that touch each
+    other and share the same label IDs. Label scores, if any, are merged by
+    their maximum. For example:
+    merge_adjacent_sections([
+        (1, 2, [0]),
+        (2, 3, [0]),
+        (3, 4, [1]),
+    ])
+    =>
+    [
+        (1, 3, [0]),
+        (3, 4, [1]),
+    ]
+    '''
+    merged = []
+    for start, end, label_ids, *scores in temporal_list_rep:
+        if merged:
+            last_start, last_end, last_label_ids, *last_scores = merged[-1]
+            if last_end == start and np.array_equal(last_label_ids, label_ids):
+                scores = [np.maximum(a, b) for a, b in zip(last_scores, scores)]
+                merged[-1] = (last_start, end, last_label_ids, *scores)
+                continue
+        merged.append((start, end, label_ids, *scores))
+    return merged
+
+
+@dataclass
+class TimelineLayout:
+    '''
+    The layout of a timeline, independent of the output format: its position
+    and its sections, repartitioned and folded by temporal_repartition.
+    '''
+    name: str
+    position: TimelinePosition
+    sections: List[List[Tuple]]
+
+
+def layout_timeline(
+    name: str, tl_pos_cal: TimelinePositionCalculator, idx: int,
+    temporal_list, video_duration, n_fold: int,
+    merge_adjacent: bool = False, with_scores: bool = False
+) -> TimelineLayout:
+    sections = temporal_repartition(
+        temporal_list, n_fold, video_duration, with_scores
+    )
+    if merge_adjacent:
+        sections = [merge_adjacent_sections(x) for x in sections]
+    return TimelineLayout(name, tl_pos_cal(idx), sections)
+
+
 class Timeline(EventItemContainer):
     def __init__(
         self, name: str,
@@ -201,8 +353,51 @@ class Timeline(EventItemContainer):
         temporal_list, video_duration, label_names,
         colour_scheme: ColourScheme,
         n_fold: int,
-        background_colour: Colour
+        background_colour: Colour,
+        merge_adjacent: bool = False,
+        coalesce_rects: bool = False,
+        max_label_name_len: Optional[int] = None,
+        drawing_scale: Optional[int] = None,
+        compact_text: bool = False,
+        char_width: float = MONOSPACE_CHAR_WIDTH,
+        max_shown_labels: Optional[int] = None,
+        time_offset: Union[int, float] = 0,
+        layout: Optional[TimelineLayout] = None,
     ):
+        '''
+        Args:
+
+            merge_adjacent: merge touching sections with identical label IDs
+            into one, so that they share a text event and a rectangle.
+
+            coalesce_rects: draw all the rectangles of the same label in one
+            event, instead of one event per rectangle.
+
+            max_label_name_len: optional int, truncate label names in the texts
+            to at most this many characters.
+
+            drawing_scale: optional int, drawing scale level of the compact
+            rectangle encoding, see Rectangle.
+
+            compact_text: do not repeat the timeline name in the label texts,
+            place them after the name instead, assuming a monospace font with
+            characters char_width times the font size wide.
+
+            char_width: character width of the font relative to the font
+            size, used by compact_text.
+
+            max_shown_labels: optional int, show at most this many labels in
+            the texts, followed by the number of labels left out. Labels with
+            higher scores are shown first, if the temporal list has scores as
+            the 4th element of its tuples, otherwise labels in ascending order.
+
+            time_offset: seconds added to all the event times, e.g. for a clip
+            in a playlist.
+
+            layout: optional TimelineLayout of this timeline computed
+            beforehand by layout_timeline with the same arguments, used
+            instead of laying out temporal_list again.
+        '''
         super().__init__()
         self.name = name
         self.tl_pos_cal = tl_pos_cal
@@ -216,40 +411,84 @@ class Timeline(EventItemContainer):
         else:
             raise ValueError('Unsupported label_names type.')
 
-        t_list_rep = temporal_repartition(temporal_list, n_fold, video_duration)
-
-        tl_pos = tl_pos_cal(idx)
+        if layout is None:
+            with_scores = (
+                max_shown_labels is not None and has_scores(temporal_list)
+            )
+            layout = layout_timeline(
+                name, tl_pos_cal, idx, temporal_list, video_duration, n_fold,
+                merge_adjacent, with_scores
+            )
+        self.layout = layout
+        t_list_rep = self.layout.sections
+        tl_pos = self.layout.position
+        video_start = Time(time_offset)
+        video_end = Time(time_offset+video_duration)
 
         name_text = Position(tl_pos.text_x, tl_pos.text_y)
         name_text += f'{self.name}:  '
         self.event_items.append(
             EventItem(
-                name='Dialogue', Start=Time(0), End=Time(video_duration),
+                name='Dialogue', Start=video_start, End=video_end,
                 Style='TimelineText', Text=name_text
             )
         )
 
+        if compact_text:
+            label_text_prefix = Position(
+                tl_pos.text_x + round(
+                    len(f'{self.name}:  ')
+                  * tl_pos_cal.font_size * char_width
+                ),
+                tl_pos.text_y
+            )
+        else:
+            label_text_prefix = name_text
+
+        label_texts = {} # built once for each label
+        def get_label_text(label_id):
+            if label_id not in label_texts:
+                label_text = str(label_id).rjust(max_label_len)
+                label_text += colour_scheme[label_id].tag() # set colour for the square
+                label_text += ' {\\bord1\\shad0}' # no border and shadow for the square
+                label_text += get_inline_rectangle(
+                    tl_pos_cal.font_size, drawing_scale
+                )
+                label_text += '{\\r}' # reset style
+                label_name = str(label_names[label_id])
+                if max_label_name_len is not None:
+                    label_name = label_name[:max_label_name_len]
+                label_text += f' {label_name}'
+                label_texts[label_id] = label_text
+            return label_texts[label_id]
+
+        label_rects = {}
+
         for i_fold in range(n_fold):
             # Label texts
-            for start, end, label_ids in t_list_rep[i_fold]:
-                label_texts = []
-                for label_i, label_id in enumerate(label_ids):
-                    label_text = str(label_id).rjust(max_label_len)
-                    label_text += colour_scheme[label_id].tag() # set colour for the square
-                    label_text += ' {\\bord1\\shad0}' # no border and shadow for the square
-                    label_text += get_inline_rectangle(tl_pos_cal.font_size)
-                    label_text += '{\\r}' # reset style
-                    label_text += f' {label_names[label_id]}'
-                    label_texts.append(label_text)
+            for start, end, label_ids, *scores in t_list_rep[i_fold]:
+                if compact_text and len(label_ids) == 0:
+                    continue # the name is shown by its own event
+                n_hidden = 0
+                if max_shown_labels is not None:
+                    n_hidden = max(len(label_ids) - max_shown_labels, 0)
+                    if scores:
+                        label_ids = label_ids[np.argsort(-scores[0], kind='stable')]
+                    label_ids = label_ids[:max_shown_labels]
+                texts = [get_label_text(x) for x in label_ids]
+                if n_hidden > 0:
+                    texts.append(f'+{n_hidden} more')
+                text = ', '.join(texts)
                 self.event_items.append(
                     EventItem(
-                        name='Dialogue', Start=Time(start), End=Time(end),
-                        Style='TimelineText', Text=name_text+', '.join(label_texts)
+                        name='Dialogue',
+                        Start=Time(time_offset+start), End=Time(time_offset+end),
+                        Style='TimelineText', Text=label_text_prefix+text
                     )
                 )
 
             # Colour rectangles
-            for start, end, label_ids in t_list_rep[i_fold]:
+            for start, end, label_ids, *_ in t_list_rep[i_fold]:
                 if len(label_ids) == 0:
                     continue
                 rect_x = start / video_duration * tl_pos_cal.display_width * n_fold
@@ -265,17 +504,34 @@ class Timeline(EventItemContainer):
                         rect_x - tl_pos_cal.display_width*i_fold,
                         rect_y + label_i*rect_l_h,
                         rect_w,
-                        rect_l_h
+                        rect_l_h,
+                        drawing_scale
                     )
-                    rect = colour_scheme[label_id].tag() + rect
+                    if coalesce_rects:
+                        label_rects.setdefault(label_id, []).append(rect)
+                        continue
                     self.event_items.append(
                         EventItem(
-                            'Dialogue', Start=Time(0), End=Time(video_duration),
-                            Style='TimelineRect', Text=Position(0, 0)+rect
+                            'Dialogue', Start=video_start, End=video_end,
+                            Style='TimelineRect', Text=local_drawing(
+                                [rect], colour_scheme[label_id].tag()
+                            )
                         )
                     )
 
-            # Moving cursor
+        # Coalesced colour rectangles, one event per label
+        for label_id, rects in label_rects.items():
+            self.event_items.append(
+                EventItem(
+                    'Dialogue', Start=video_start, End=video_end,
+                    Style='TimelineRect', Text=local_drawing(
+                        rects, colour_scheme[label_id].tag()
+                    )
+                )
+            )
+
+        # Moving cursors
+        for i_fold in range(n_fold):
             rect_cursor = Colour().tag()
             rect_cursor += Move(
                 0, tl_pos.timeline_ys[i_fold],
@@ -283,50 +539,63 @@ class Timeline(EventItemContainer):
             )
             rect_cursor += Rectangle(
                 0, 0,
-                tl_pos_cal.cursor_width, tl_pos_cal.timeline_height
+                tl_pos_cal.cursor_width, tl_pos_cal.timeline_height,
+                drawing_scale
             )
             start = i_fold / n_fold * video_duration
             end = (i_fold+1) / n_fold * video_duration
             self.event_items.append(
                 EventItem(
-                    name='Dialogue', Start=Time(start), End=Time(end),
+                    name='Dialogue',
+                    Start=Time(time_offset+start), End=Time(time_offset+end),
                     Style='MovingCursor', Text=rect_cursor
                 )
             )
 
         # background colour
         if not background_colour.is_transparent():
-            bg_rect = Position(0, 0)
-            bg_rect += background_colour.tag()
-            bg_rect += Rectangle(
+            bg_rect = local_drawing([Rectangle(
                 0, tl_pos.timeline_ys[0],
                 tl_pos_cal.display_width,
-                n_fold*tl_pos_cal.bar_per_height- tl_pos_cal.timeline_margin_top
-            )
+                n_fold*tl_pos_cal.bar_per_height- tl_pos_cal.timeline_margin_top,
+                drawing_scale
+            )], background_colour.tag())
             self.event_items.append(
                 EventItem(
-                    'Dialogue', Start=Time(0), End=Time(video_duration),
+                    'Dialogue', Start=video_start, End=video_end,
                     Layer=0, Style='TimelineRect', Text=bg_rect
                 )
             )
 
 
+def get_legend_entry(
+    colour_scheme: ColourScheme, i, digit_length, font_size, scale=None
+):
+    return (
+        '{\\bord1\\shad0}'
+        + colour_scheme[i].tag()
+        + get_inline_rectangle(font_size, scale)
+        + f'{{\\bord0\\shad0\\fs{max(1, font_size//4)}}}\\h'
+        # a small hard space
+        + '{\\r}' # reset style
+        + str(i).rjust(digit_length)
+    )
+
+
 class ColourSchemeLegend(EventItemContainer):
     def __init__(
         self, colour_scheme: ColourScheme, start, end,
-        tl_pos_cal: TimelinePositionCalculator
+        tl_pos_cal: TimelinePositionCalculator,
+        drawing_scale: Optional[int] = None
     ):
         super().__init__()
         length = len(colour_scheme)
         digit_length = len(str(length-1))
         text = [
-            '{\\bord1\\shad0}'
-            + colour_scheme[i].tag()
-            + get_inline_rectangle(tl_pos_cal.font_size)
-            + f'{{\\bord0\\shad0\\fs{max(1, tl_pos_cal.font_size//4)}}}\\h'
-            # a small hard space
-            + '{\\r}' # reset style
-            + str(i).rjust(digit_length)
+            get_legend_entry(
+                colour_scheme, i, digit_length, tl_pos_cal.font_size,
+                drawing_scale
+            )
             for i in range(length)
         ]
         text = (' '*3).join(text)
@@ -337,3 +606,84 @@ class ColourSchemeLegend(EventItemContainer):
             name='Dialogue', Start=Time(start), End=Time(end),
             Style='LegendText', Text=text
         )]
+
+
+class WindowedColourSchemeLegend(EventItemContainer):
+    def __init__(
+        self, colour_scheme: ColourScheme, temporal_lists: List[List],
+        video_duration, tl_pos_cal: TimelinePositionCalculator,
+        window: Union[int, float], max_entries: Optional[int] = None,
+        drawing_scale: Optional[int] = None,
+        time_offset: Union[int, float] = 0
+    ):
+        '''
+        A legend showing only the labels present in the timelines within each
+        time window of the given length, so that its length follows what is
+        visible rather than the size of the colour scheme. Consecutive windows
+        with the same labels share one event.
+
+        Args:
+
+            temporal_lists: list of the temporal lists shown in the timelines.
+
+            window: length of the time windows in seconds.
+
+            max_entries: optional int, show at most this many labels in a
+            window, followed by the number of labels left out.
+
+            drawing_scale: optional int, drawing scale level of the compact
+            rectangle encoding, see Rectangle.
+
+            time_offset: seconds added to all the event times.
+        '''
+        super().__init__()
+        if window <= 0:
+            raise ValueError('Legend window must be positive.')
+        digit_length = len(str(len(colour_scheme)-1))
+        n_windows = max(int(np.ceil(video_duration / window)), 1)
+
+        window_labels = [set() for _ in range(n_windows)]
+        for temporal_list in temporal_lists:
+            for start, end, label_id, *_ in temporal_list:
+                if end <= start:
+                    continue
+                first = min(max(int(start // window), 0), n_windows-1)
+                last = min(max(int(np.ceil(end / window)), first+1), n_windows)
+                for i_window in range(first, last):
+                    window_labels[i_window].add(label_id)
+
+        pos = Position(tl_pos_cal.text_margin_left, tl_pos_cal.text_margin_top)
+        entries = {}
+        last_text = None
+        for i_window, label_ids in enumerate(window_labels):
+            label_ids = sorted(label_ids)
+            n_hidden = 0
+            if max_entries is not None and len(label_ids) > max_entries:
+                n_hidden = len(label_ids) - max_entries
+                label_ids = label_ids[:max_entries]
+            text = []
+            for i in label_ids:
+                if i not in entries:
+                    entries[i] = get_legend_entry(
+                        colour_scheme, i, digit_length, tl_pos_cal.font_size,
+                        drawing_scale
+                    )
+                text.append(entries[i])
+            if n_hidden > 0:
+                text.append(f'+{n_hidden}')
+            text = (' '*3).join(text)
+            start = i_window * window
+            end = min((i_window+1) * window, video_duration)
+            if text and text == last_text:
+                self.event_items[-1] = EventItem(
+                    name='Dialogue', Start=self.event_items[-1].Start,
+                    End=Time(time_offset+end),
+                    Style='LegendText', Text=pos + text
+                )
+            elif text:
+                self.event_items.append(EventItem(
+                    name='Dialogue',
+                    Start=Time(time_offset+start), End=Time(time_offset+end),
+                    Style='LegendText', Text=pos + text
+                ))
+            last_text = text
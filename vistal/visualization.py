@@ -1,3 +1,4 @@
+import copy
 from typing import Dict, List, Tuple, Union, Optional
 
 from vistal.subtitle.elements import Colour
@@ -6,14 +7,11 @@ from .subtitle.sections import (
     ScriptInfo,
     V4PlusStyleItem,
     V4plusStyles,
-    Events,
-    AssSubtitle
 )
+from .analysis import RenderBudget
+from .model import VistalSubtitle
 from .timeline import (
-    ColourScheme,
-    ColourSchemeLegend,
-    TimelinePositionCalculator,
-    Timeline
+    MONOSPACE_CHAR_WIDTH, ColourScheme, TimelinePositionCalculator
 )
 
 __all__ = ['vistal']
@@ -37,8 +35,17 @@ def vistal(
     cursor_width: Optional[int] = None,
     show_legend: Optional[bool] = False,
     legend_font_size: Optional[int] = None,
+    legend_window: Optional[Union[int, float]] = None,
+    legend_max_entries: Optional[int] = None,
     n_fold: int = 1,
     background_colour: Colour = Colour(alpha=255),
+    drawing_scale: Optional[int] = None,
+    compact_text: bool = False,
+    char_width: float = MONOSPACE_CHAR_WIDTH,
+    max_shown_labels: Optional[int] = None,
+    render_budget: Optional[RenderBudget] = None,
+    error_timeline_dict: Optional[Dict[str, Tuple[str, str]]] = None,
+    error_colour_scheme: Optional[ColourScheme] = None,
 ):
     '''
     Construct the main visualization elements.
@@ -51,7 +58,8 @@ def vistal(
 
         temporal_list_dict: dict of {name:temporal_list}, where temporal_list is
         a list of tuple(start, end, label_id), specifying the starting second,
-        ending second and an integer label_id for a period of action.
+        ending second and an integer label_id for a period of action. The tuples
+        may have a 4th element, the score, used by max_shown_labels.
 
         label_names: dict mapping from integer label_ids to string label names,
         or list containing the label_ids.
@@ -94,16 +102,59 @@ def vistal(
 
         legend_font_size: optional int for overriding font_size of legend,
 
+        legend_window: optional time window length in seconds. If given, the
+        legend shows only the labels present in the timelines within each
+        window, instead of the whole colour scheme, which suits large label
+        vocabularies.
+
+        legend_max_entries: optional int, maximum number of labels shown in
+        the legend of each window.
+
         n_fold: fold each timeline into equal parts for clearer illustration for
         relatively short actions.
 
         background_colour: optional Colour for background colour of the coloured
         timelines.
 
+        drawing_scale: optional int, use the compact drawing encoding with
+        coordinates in units of 1/2^(drawing_scale-1) pixel, e.g. 3 for
+        quarter pixels, relative to a local origin for each drawing. This
+        avoids gaps between rectangles caused by rounding coordinates to whole
+        pixels, and makes the timeline drawings somewhat shorter.
+
+        compact_text: optional bool, show the labels after the timeline name
+        without repeating the name in every label text. It assumes a monospace
+        font.
+
+        char_width: optional float, character width of the font relative to
+        the font size, used by compact_text to place the labels after the
+        name. The default 0.5 suits Ubuntu Mono; Roboto Mono, Monaco and
+        Cascadia Mono need about 0.6.
+
+        max_shown_labels: optional int, show at most this many overlapping
+        labels in the texts, followed by the number of labels left out. If the
+        tuples of a temporal list have a score as the 4th element, labels with
+        higher scores are shown first.
+
+        render_budget: optional RenderBudget. If given, the timelines are
+        simplified step by step (merging identical adjacent sections,
+        coalescing rectangles, truncating label names) until the peak render
+        cost fits in the budget. A warning is issued if it never fits.
+
+        error_timeline_dict: optional dict of {name:(gt_name, pred_name)}, where
+        gt_name and pred_name are keys of temporal_list_dict. For each item, an
+        extra timeline is shown above the others, marking where the prediction
+        matches the ground truth, and where there are false positives, misses
+        and wrong labels.
+
+        error_colour_scheme: optional ColourScheme for the error timelines, in
+        the order of match, false positive, miss and wrong label.
+
     Returns:
 
-        An AssSubtitle object, containing the visualization elements for temporal
-        action localization.
+        A VistalSubtitle object, containing the visualization elements for
+        temporal action localization. It is an AssSubtitle whose timelines and
+        legend can be edited afterwards, see VistalSubtitle.
     '''
 
     if timeline_height is None:
@@ -166,8 +217,6 @@ def vistal(
         BorderStyle=0, Outline=text_outline, Shadow=text_shadow,
         Alignment=7, MarginL=0, MarginR=10, MarginV=10
     ))
-    es = Events()
-
     tl_pos_cal = TimelinePositionCalculator(
         display_width, display_height,
         timeline_height, timeline_margin_top, timeline_margin_bot,
@@ -175,19 +224,24 @@ def vistal(
         cursor_width, n_fold
     )
 
-    for i, (name, temporal_list) in enumerate(temporal_list_dict.items()):
-        timeline = Timeline(
-            name, tl_pos_cal, i, temporal_list, video_duration, label_names,
-            colour_scheme, n_fold, background_colour
-        )
-        for item in timeline:
-            es.append_item(item)
+    legend_pos_cal = copy.copy(tl_pos_cal)
+    if legend_font_size and legend_font_size > 0:
+        legend_pos_cal.font_size = legend_font_size
 
+    sub = VistalSubtitle(
+        si, vs, tl_pos_cal, legend_pos_cal, video_duration, n_fold,
+        background_colour, drawing_scale, compact_text, max_shown_labels,
+        char_width=char_width
+    )
+    for name, temporal_list in temporal_list_dict.items():
+        sub.set_timeline(name, temporal_list, label_names, colour_scheme)
+    if error_timeline_dict is not None:
+        for name, (gt_name, pred_name) in error_timeline_dict.items():
+            sub.set_error_timeline(name, gt_name, pred_name, error_colour_scheme)
     if show_legend:
-        if legend_font_size and legend_font_size > 0:
-            tl_pos_cal.font_size = legend_font_size
-        csl = ColourSchemeLegend(colour_scheme, 0, video_duration, tl_pos_cal)
-        for item in csl:
-            es.append_item(item)
+        sub.set_legend(colour_scheme, legend_window, legend_max_entries)
+
+    if render_budget is not None:
+        sub.fit_render_budget(render_budget)
 
-    return AssSubtitle(si, vs, es)
+    return sub